@@ -1,16 +1,26 @@
 #!/usr/bin/env python3
-import argparse
-import codecs
 import datetime as dt
+import functools
+import heapq
 import json
 import os
 import re
-import sqlite3
 import sys
+from collections import defaultdict
 from pathlib import Path
-from typing import Any, Dict, Optional, Tuple
-from urllib.error import HTTPError
-from urllib.request import Request, urlopen
+from typing import TYPE_CHECKING, Any, Dict, Optional, Sequence, Tuple
+
+# sqlite3, urllib and concurrent.futures are imported where they are used: the
+# menubar app spawns this script on every refresh, and not every run needs all
+# of them.
+if TYPE_CHECKING:
+    import sqlite3
+
+try:
+    # Optional: parses bytes directly and is much faster on the large cache blobs.
+    from orjson import loads as _json_loads
+except ImportError:
+    _json_loads = json.loads
 
 HOME = Path.home()
 APP_SUPPORT_DIR = HOME / 'Library' / 'Application Support' / 'SimplifiWorthBar'
@@ -19,21 +29,58 @@ WEBKIT_DEFAULT = CONTAINER / 'Library/WebKit/WebsiteData/Default'
 STATE_FILE = APP_SUPPORT_DIR / 'last_label.txt'
 TOKEN_CACHE_FILE = APP_SUPPORT_DIR / 'token_cache.json'
 OAUTH_CONFIG_FILE = APP_SUPPORT_DIR / 'oauth_config.json'
+AUTH_SESSION_CACHE_FILE = APP_SUPPORT_DIR / 'auth_session.json'
 
 SIMPLIFI_HOST = 'simplifi.quicken.com'
 SIMPLIFI_BASE_URL = f'https://{SIMPLIFI_HOST}'
 HTTP_TIMEOUT_SECONDS = 30
 
+_MAIN_BUNDLE_RE = re.compile(rb'src="(/main\.[^"]+\.js)"')
+_JS_ESCAPE_RE = re.compile(
+    r'\\(u[dD][89abAB][0-9a-fA-F]{2}\\u[dD][c-fC-F][0-9a-fA-F]{2}|u[0-9a-fA-F]{4}|x[0-9a-fA-F]{2}|.)',
+    re.DOTALL,
+)
+_JS_SIMPLE_ESCAPES = {'n': '\n', 'r': '\r', 't': '\t', 'b': '\b', 'f': '\f', 'v': '\v', '0': '\0', '\n': ''}
+_OAUTH_CONFIG_KEYS = ('services_url', 'client_id', 'client_secret', 'redirect_uri')
+_OAUTH_REVALIDATE_INTERVAL = dt.timedelta(hours=6)
+
 
 def _now_utc() -> dt.datetime:
     return dt.datetime.now(dt.timezone.utc)
 
 
-def _chmod_600(path: Path) -> None:
+@functools.lru_cache(maxsize=4)
+def _parse_json_file(path: str, mtime_ns: int) -> Any:
+    # mtime_ns is only part of the cache key, so a rewritten file is parsed again.
+    return json.loads(Path(path).read_text())
+
+
+def _read_json_file(path: Path) -> Any:
+    """Return the parsed JSON state file, memoized per process; None if missing or invalid."""
     try:
-        os.chmod(path, 0o600)
-    except OSError:
-        pass
+        return _parse_json_file(str(path), path.stat().st_mtime_ns)
+    except Exception:
+        return None
+
+
+def _write_json_file(path: Path, payload: Any, indent: Optional[int] = 2) -> None:
+    import tempfile
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # mkstemp creates the file 0600, so tokens are never readable by other users,
+    # and os.replace means a concurrent run never sees a half-written file.
+    fd, tmp_path = tempfile.mkstemp(prefix=f'.{path.name}.', dir=path.parent)
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(json.dumps(payload, indent=indent) + '\n')
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+    _parse_json_file.cache_clear()
 
 
 def _parse_iso_datetime(value: Any) -> Optional[dt.datetime]:
@@ -50,35 +97,54 @@ def _parse_iso_datetime(value: Any) -> Optional[dt.datetime]:
 
 def _parse_js_single_quoted_string(s: str, start_idx: int) -> Tuple[str, int]:
     """Return (raw_contents, end_quote_idx). start_idx points to the char after the opening quote."""
-    out: list[str] = []
+    # Escapes are preserved for _decode_js_string, so the contents are a
+    # plain slice; we only need to hop over backslash pairs to find the closing quote.
     i = start_idx
+    quote = -1
 
-    while i < len(s):
-        ch = s[i]
-        if ch == "'":
-            return ''.join(out), i
-        if ch == '\\':
-            # Preserve escapes for a later unicode_escape decode.
-            if i + 1 < len(s):
-                out.append(ch)
-                out.append(s[i + 1])
-                i += 2
-                continue
-            out.append(ch)
-            i += 1
-            continue
-        out.append(ch)
-        i += 1
+    while True:
+        if quote < i:
+            quote = s.find("'", i)
+            if quote < 0:
+                raise ValueError('Unterminated JS string')
+        backslash = s.find('\\', i, quote)
+        if backslash < 0:
+            return s[start_idx:quote], quote
+        i = backslash + 2
+
+
+def _decode_js_escape(m: re.Match) -> str:
+    esc = m.group(1)
+    if len(esc) == 11:
+        # A \uXXXX\uXXXX surrogate pair is one astral character; decoding the
+        # halves separately leaves lone surrogates that orjson rejects.
+        high, low = int(esc[1:5], 16), int(esc[7:], 16)
+        return chr(0x10000 + ((high - 0xD800) << 10) + (low - 0xDC00))
+    if len(esc) > 1:
+        return chr(int(esc[1:], 16))
+    return _JS_SIMPLE_ESCAPES.get(esc, esc)
 
-    raise ValueError('Unterminated JS string')
+
+def _decode_js_string(raw: str) -> str:
+    if '\\' not in raw:
+        return raw
+    return _JS_ESCAPE_RE.sub(_decode_js_escape, raw)
+
+
+def _http_request(method: str, url: str, body: Optional[bytes] = None, headers: Optional[Dict[str, str]] = None) -> bytes:
+    from urllib.request import Request, urlopen
+
+    req = Request(url, data=body, headers=headers or {}, method=method)
+    with urlopen(req, timeout=HTTP_TIMEOUT_SECONDS) as resp:
+        return resp.read()
 
 
 def _fetch_main_bundle_url() -> str:
-    html = urlopen(SIMPLIFI_BASE_URL + '/', timeout=HTTP_TIMEOUT_SECONDS).read().decode('utf-8', errors='ignore')
-    m = re.search(r'src="(/main\.[^"]+\.js)"', html)
+    data = _http_request('GET', SIMPLIFI_BASE_URL + '/')
+    m = _MAIN_BUNDLE_RE.search(data)
     if not m:
         raise RuntimeError('Could not find main bundle script in Simplifi HTML')
-    return SIMPLIFI_BASE_URL + m.group(1)
+    return SIMPLIFI_BASE_URL + m.group(1).decode('ascii', errors='ignore')
 
 
 def _extract_oauth_config_from_main_bundle(js_text: str) -> Dict[str, Any]:
@@ -95,9 +161,9 @@ def _extract_oauth_config_from_main_bundle(js_text: str) -> Dict[str, Any]:
 
     start = start + len(parse_marker)
     raw, _ = _parse_js_single_quoted_string(js_text, start)
-    decoded = codecs.decode(raw, 'unicode_escape')
+    decoded = _decode_js_string(raw)
 
-    config = json.loads(decoded)
+    config = _json_loads(decoded)
     if not isinstance(config, dict):
         raise RuntimeError('Simplifi config payload is not a JSON object')
 
@@ -139,22 +205,36 @@ def _extract_oauth_config_from_main_bundle(js_text: str) -> Dict[str, Any]:
     }
 
 
-def _load_oauth_config() -> Dict[str, str]:
-    if OAUTH_CONFIG_FILE.exists():
-        try:
-            cached = json.loads(OAUTH_CONFIG_FILE.read_text())
-            if isinstance(cached, dict) and cached.get('services_url') and cached.get('client_id') and cached.get('client_secret') and cached.get('redirect_uri'):
-                return {
-                    'services_url': str(cached['services_url']),
-                    'client_id': str(cached['client_id']),
-                    'client_secret': str(cached['client_secret']),
-                    'redirect_uri': str(cached['redirect_uri']),
-                }
-        except Exception:
-            pass
+def _oauth_config_from(obj: Any) -> Optional[Dict[str, str]]:
+    if not isinstance(obj, dict) or not all(obj.get(k) for k in _OAUTH_CONFIG_KEYS):
+        return None
+    return {k: str(obj[k]) for k in _OAUTH_CONFIG_KEYS}
+
+
+def _load_oauth_config(revalidate: bool = False) -> Dict[str, str]:
+    """Return the OAuth client config, extracting it from the Simplifi bundle if needed.
+
+    With revalidate=True the cached config is checked against the live bundle URL,
+    at most once per _OAUTH_REVALIDATE_INTERVAL. Bundle URLs are content-hashed, so
+    an unchanged URL means an unchanged config and the bundle is not downloaded.
+    """
+    loaded = _read_json_file(OAUTH_CONFIG_FILE)
+    cached: Dict[str, Any] = loaded if isinstance(loaded, dict) else {}
+
+    cached_cfg = _oauth_config_from(cached)
+    if cached_cfg:
+        if not revalidate:
+            return cached_cfg
+        revalidated_at = _parse_iso_datetime(cached.get('revalidated_at'))
+        if revalidated_at and _now_utc() - revalidated_at < _OAUTH_REVALIDATE_INTERVAL:
+            return cached_cfg
 
     main_url = _fetch_main_bundle_url()
-    js_text = urlopen(main_url, timeout=HTTP_TIMEOUT_SECONDS).read().decode('utf-8', errors='ignore')
+    if cached_cfg and cached.get('main_bundle_url') == main_url:
+        _write_json_file(OAUTH_CONFIG_FILE, {**cached, 'revalidated_at': _now_utc().isoformat()})
+        return cached_cfg
+
+    js_text = _http_request('GET', main_url).decode('utf-8', errors='ignore')
     extracted = _extract_oauth_config_from_main_bundle(js_text)
 
     payload = {
@@ -163,31 +243,76 @@ def _load_oauth_config() -> Dict[str, str]:
         'main_bundle_url': main_url,
     }
 
-    OAUTH_CONFIG_FILE.parent.mkdir(parents=True, exist_ok=True)
-    OAUTH_CONFIG_FILE.write_text(json.dumps(payload, indent=2) + '\n')
-    _chmod_600(OAUTH_CONFIG_FILE)
+    _write_json_file(OAUTH_CONFIG_FILE, payload)
 
-    return {
-        'services_url': str(extracted['services_url']),
-        'client_id': str(extracted['client_id']),
-        'client_secret': str(extracted['client_secret']),
-        'redirect_uri': str(extracted['redirect_uri']),
-    }
+    return {k: str(extracted[k]) for k in _OAUTH_CONFIG_KEYS}
 
 
-def _find_simplifi_origin_dir() -> Path:
+def _read_prefix(path: Path, size: int = 4096) -> bytes:
+    # WebKit origin files are a few hundred bytes; never read more than we need.
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        return os.read(fd, size)
+    finally:
+        os.close(fd)
+
+
+@functools.lru_cache(maxsize=1)
+def _simplifi_origin_dirs() -> Tuple[Path, ...]:
     if not WEBKIT_DEFAULT.exists():
         raise FileNotFoundError(f'MenubarX WebKit storage missing: {WEBKIT_DEFAULT}')
 
+    found: list[Path] = []
     for origin_file in WEBKIT_DEFAULT.glob('*/*/origin'):
         try:
-            origin_data = origin_file.read_bytes()
+            origin_data = _read_prefix(origin_file)
         except OSError:
             continue
         if SIMPLIFI_HOST.encode('utf-8') in origin_data:
-            return origin_file.parent
+            found.append(origin_file.parent)
+    return tuple(found)
+
+
+def _find_simplifi_origin_dir() -> Path:
+    origin_dirs = _simplifi_origin_dirs()
+    if not origin_dirs:
+        raise RuntimeError(f'Could not locate MenubarX origin directory for {SIMPLIFI_HOST}')
+    return origin_dirs[0]
 
-    raise RuntimeError(f'Could not locate MenubarX origin directory for {SIMPLIFI_HOST}')
+
+def _connect_readonly(db_path: Path) -> 'sqlite3.Connection':
+    import sqlite3
+
+    # MenubarX owns these DBs and we never write. With no pending WAL we can open
+    # them immutable and skip locking/change detection; otherwise fall back to a
+    # plain read-only open so uncheckpointed WAL frames are still visible.
+    # The WAL check is only exact while MenubarX isn't running: a checkpoint that
+    # lands mid-read can show the unlocked reader a torn page. We accept that; the
+    # read fails or decodes garbage, and the next refresh reads it again.
+    try:
+        wal_pending = Path(f'{db_path}-wal').stat().st_size > 0
+    except OSError:
+        wal_pending = False
+    flags = 'mode=ro' if wal_pending else 'mode=ro&immutable=1'
+    conn = sqlite3.connect(f'file:{db_path}?{flags}', uri=True)
+    try:
+        conn.execute('PRAGMA query_only=1')
+    except BaseException:
+        conn.close()
+        raise
+    return conn
+
+
+def _db_fingerprint(db_path: Path) -> list:
+    # WebKit writes through the WAL first, so the -wal sidecar is part of the state.
+    fingerprint: list = []
+    for path in (db_path, Path(f'{db_path}-wal')):
+        try:
+            st = path.stat()
+            fingerprint += [st.st_mtime_ns, st.st_size]
+        except OSError:
+            fingerprint += [None, None]
+    return fingerprint
 
 
 def _load_auth_session() -> Dict[str, Any]:
@@ -196,7 +321,33 @@ def _load_auth_session() -> Dict[str, Any]:
     if not db_path.exists():
         raise FileNotFoundError(f'MenubarX LocalStorage DB missing: {db_path}')
 
-    conn = sqlite3.connect(f'file:{db_path}?mode=ro', uri=True)
+    fingerprint = _db_fingerprint(db_path)
+    cached = _read_json_file(AUTH_SESSION_CACHE_FILE)
+    if (
+        isinstance(cached, dict)
+        and cached.get('db_path') == str(db_path)
+        and cached.get('fingerprint') == fingerprint
+        and isinstance(cached.get('session'), dict)
+    ):
+        return cached['session']
+
+    session = _read_auth_session(db_path)
+
+    payload = {
+        'db_path': str(db_path),
+        'fingerprint': fingerprint,
+        'session': session,
+    }
+    try:
+        _write_json_file(AUTH_SESSION_CACHE_FILE, payload, indent=None)
+    except OSError:
+        pass
+
+    return session
+
+
+def _read_auth_session(db_path: Path) -> Dict[str, Any]:
+    conn = _connect_readonly(db_path)
     try:
         cur = conn.cursor()
         cur.execute("SELECT value FROM ItemTable WHERE key='authSession'")
@@ -210,7 +361,7 @@ def _load_auth_session() -> Dict[str, Any]:
         if not isinstance(blob, (bytes, bytearray)):
             raise RuntimeError('authSession value is not a blob')
 
-        text = bytes(blob).decode('utf-16le', errors='ignore')
+        text = blob.decode('utf-16le', errors='ignore')
         obj = json.loads(text)
         if not isinstance(obj, dict):
             raise RuntimeError('authSession is not a JSON object')
@@ -220,14 +371,7 @@ def _load_auth_session() -> Dict[str, Any]:
 
 
 def _load_cached_access_token(refresh_token: str) -> Optional[Tuple[str, dt.datetime]]:
-    if not TOKEN_CACHE_FILE.exists():
-        return None
-
-    try:
-        cached = json.loads(TOKEN_CACHE_FILE.read_text())
-    except Exception:
-        return None
-
+    cached = _read_json_file(TOKEN_CACHE_FILE)
     if not isinstance(cached, dict):
         return None
 
@@ -249,9 +393,7 @@ def _write_token_cache(refresh_token: str, token_obj: Dict[str, Any]) -> None:
         'accessTokenExpired': token_obj.get('accessTokenExpired'),
         'updated_at': _now_utc().isoformat(),
     }
-    TOKEN_CACHE_FILE.parent.mkdir(parents=True, exist_ok=True)
-    TOKEN_CACHE_FILE.write_text(json.dumps(payload, indent=2) + '\n')
-    _chmod_600(TOKEN_CACHE_FILE)
+    _write_json_file(TOKEN_CACHE_FILE, payload)
 
 
 def _refresh_access_token(refresh_token: str, oauth_cfg: Dict[str, str]) -> Dict[str, Any]:
@@ -265,53 +407,76 @@ def _refresh_access_token(refresh_token: str, oauth_cfg: Dict[str, str]) -> Dict
         'refreshToken': refresh_token,
     }
 
-    req = Request(
+    body = _http_request(
+        'POST',
         url,
-        data=json.dumps(payload).encode('utf-8'),
+        body=json.dumps(payload).encode('utf-8'),
         headers={'Content-Type': 'application/json', 'Accept': 'application/json'},
-        method='POST',
     )
 
-    with urlopen(req, timeout=HTTP_TIMEOUT_SECONDS) as resp:
-        body = resp.read()
-
-    obj = json.loads(body)
+    obj = _json_loads(body)
     if not isinstance(obj, dict) or not obj.get('accessToken'):
         raise RuntimeError('Refresh token exchange did not return accessToken')
 
     return obj
 
 
+def _renew_access_token(refresh_token: str, oauth_cfg: Dict[str, str]) -> Tuple[str, Dict[str, str]]:
+    """Exchange the refresh token and cache the result; return (access_token, oauth_cfg)."""
+    from urllib.error import HTTPError
+
+    try:
+        token_obj = _refresh_access_token(refresh_token, oauth_cfg)
+    except HTTPError as e:
+        if e.code not in (400, 401):
+            raise
+        # The client credentials come from the cached bundle config; if Simplifi
+        # shipped a new bundle they may have rotated, so revalidate and retry. The
+        # check is rate-limited, so a revoked refresh token doesn't cost extra
+        # requests on every refresh.
+        fresh_cfg = _load_oauth_config(revalidate=True)
+        if fresh_cfg == oauth_cfg:
+            raise
+        oauth_cfg = fresh_cfg
+        token_obj = _refresh_access_token(refresh_token, oauth_cfg)
+
+    _write_token_cache(refresh_token, token_obj)
+    return str(token_obj['accessToken']), oauth_cfg
+
+
 def _api_get_json(services_url: str, path: str, access_token: str, dataset_id: str) -> Dict[str, Any]:
     url = services_url.rstrip('/') + path
-    req = Request(
+    body = _http_request(
+        'GET',
         url,
         headers={
             'Authorization': f'Bearer {access_token}',
             'qcs-dataset-id': str(dataset_id),
             'Accept': 'application/json',
         },
-        method='GET',
     )
 
-    with urlopen(req, timeout=HTTP_TIMEOUT_SECONDS) as resp:
-        body = resp.read()
-
-    obj = json.loads(body)
+    obj = _json_loads(body)
     if not isinstance(obj, dict):
         raise RuntimeError(f'Unexpected response type for {path}')
 
     return obj
 
 
+def _fetch_accounts_and_balances(services_url: str, access_token: str, dataset_id: str) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    from concurrent.futures import ThreadPoolExecutor
+
+    # The two requests are independent, so overlap their round-trips.
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        accounts_future = pool.submit(_api_get_json, services_url, '/accounts', access_token, dataset_id)
+        balances_future = pool.submit(_api_get_json, services_url, '/accounts/balances', access_token, dataset_id)
+        return accounts_future.result(), balances_future.result()
+
+
 # ----- MenubarX cache fallback -----
 
-def clean_key(value) -> str:
-    if isinstance(value, bytes):
-        raw = value.decode('utf-8', errors='ignore')
-    else:
-        raw = str(value)
-    return raw.replace('\x00', '')
+CACHE_STORE_NAMES = ('accountsStore', 'accountsBalancesHistoryStore')
+_STORE_KEY_ENCODINGS = ('utf-8', 'utf-16le', 'utf-16be')
 
 
 def decode_payload(blob: bytes):
@@ -322,47 +487,56 @@ def decode_payload(blob: bytes):
         if payload[:1] not in (b'{', b'['):
             continue
         try:
-            return json.loads(payload.decode('utf-8'))
+            return _json_loads(payload)
         except json.JSONDecodeError:
             continue
     raise ValueError('Unable to decode Simplifi cache payload')
 
 
-def find_blob_by_store_name(store_name: str) -> bytes:
-    if not WEBKIT_DEFAULT.exists():
-        raise FileNotFoundError(f'MenubarX WebKit storage missing: {WEBKIT_DEFAULT}')
-
-    for origin_file in WEBKIT_DEFAULT.glob('*/*/origin'):
-        try:
-            origin_data = origin_file.read_bytes()
-        except OSError:
-            continue
+def find_blobs_by_store_names(store_names: Sequence[str]) -> Dict[str, bytes]:
+    """Look up several IndexedDB stores, opening each MenubarX database at most once."""
+    import sqlite3
 
-        if SIMPLIFI_HOST.encode('utf-8') not in origin_data:
-            continue
+    # WebKit serializes keys as UTF-8 or UTF-16LE; UTF-16BE is matched too, since
+    # the old NUL-stripping comparison accepted it.
+    needles = [(name, tuple(name.encode(enc) for enc in _STORE_KEY_ENCODINGS)) for name in store_names]
+    found: Dict[str, bytes] = {}
 
-        indexeddb_root = origin_file.parent / 'IndexedDB'
+    for origin_dir in _simplifi_origin_dirs():
+        indexeddb_root = origin_dir / 'IndexedDB'
         if not indexeddb_root.exists():
             continue
 
         for db_path in indexeddb_root.glob('*/IndexedDB.sqlite3'):
+            pending = [n for n in needles if n[0] not in found]
+            if not pending:
+                return found
+
+            params = [enc for _, encoded in pending for enc in encoded]
+            where = ' OR '.join(['instr(key, ?) > 0'] * len(params))
             try:
-                conn = sqlite3.connect(f'file:{db_path}?mode=ro', uri=True)
-                cur = conn.cursor()
-                cur.execute('SELECT key, value FROM Records')
-                for key_obj, value_blob in cur.fetchall():
-                    key = clean_key(key_obj)
-                    if store_name in key and isinstance(value_blob, (bytes, bytearray)):
-                        return bytes(value_blob)
+                conn = _connect_readonly(db_path)
+            except sqlite3.Error:
+                continue
+            try:
+                for key_obj, value_blob in conn.execute(f'SELECT key, value FROM Records WHERE {where}', params):
+                    if not isinstance(value_blob, (bytes, bytearray)):
+                        continue
+                    key = key_obj if isinstance(key_obj, bytes) else str(key_obj).encode('utf-8')
+                    for name, encoded in pending:
+                        if name not in found and any(enc in key for enc in encoded):
+                            found[name] = bytes(value_blob)
+                    if len(found) == len(needles):
+                        return found
             except sqlite3.Error:
                 continue
             finally:
-                try:
-                    conn.close()
-                except Exception:
-                    pass
+                conn.close()
 
-    raise RuntimeError(f'Could not find {store_name} in MenubarX cache')
+    for name in store_names:
+        if name not in found:
+            raise RuntimeError(f'Could not find {name} in MenubarX cache')
+    return found
 
 
 def to_number(value):
@@ -373,6 +547,9 @@ def to_number(value):
     return None
 
 
+_BALANCE_FIELDS = ('normalizedBalance', 'currentBalanceAsOf', 'onlineBalance', 'balanceAsOf')
+
+
 def compute_total(accounts_obj) -> float:
     resources = accounts_obj.get('data', {}).get('resourcesById', {})
     total = 0.0
@@ -384,14 +561,12 @@ def compute_total(accounts_obj) -> float:
         if rec.get('isDeleted') is True or rec.get('isIgnored') is True or rec.get('isClosed') is True:
             continue
 
-        balance = (
-            to_number(rec.get('normalizedBalance'))
-            or to_number(rec.get('currentBalanceAsOf'))
-            or to_number(rec.get('onlineBalance'))
-            or to_number(rec.get('balanceAsOf'))
-            or 0.0
-        )
-        total += balance
+        # First non-zero numeric field wins; bools are excluded by the exact type check.
+        for field in _BALANCE_FIELDS:
+            value = rec.get(field)
+            if value and type(value) in (int, float):
+                total += value
+                break
 
     return total
 
@@ -412,12 +587,13 @@ def compute_daily_percent(history_obj) -> float:
                 continue
             totals_by_date[date] = totals_by_date.get(date, 0.0) + value
 
-    if len(totals_by_date) < 2:
+    # ISO dates sort lexicographically; only the two most recent matter.
+    latest_two = heapq.nlargest(2, totals_by_date)
+    if len(latest_two) < 2:
         return 0.0
 
-    dates = sorted(totals_by_date.keys())
-    yesterday_total = totals_by_date[dates[-2]]
-    today_total = totals_by_date[dates[-1]]
+    today_total = totals_by_date[latest_two[0]]
+    yesterday_total = totals_by_date[latest_two[1]]
 
     if abs(yesterday_total) < 1e-9:
         return 0.0
@@ -425,20 +601,23 @@ def compute_daily_percent(history_obj) -> float:
     return ((today_total - yesterday_total) / abs(yesterday_total)) * 100.0
 
 
+_COMPACT_SCALES = (
+    (1_000_000_000_000, 'T'),
+    (1_000_000_000, 'B'),
+    (1_000_000, 'M'),
+    (1_000, 'K'),
+)
+
+
 def format_compact_usd(value: float) -> str:
     sign = '-' if value < 0 else ''
     absolute = abs(value)
 
-    if absolute >= 1_000_000_000_000:
-        shown, suffix = absolute / 1_000_000_000_000, 'T'
-    elif absolute >= 1_000_000_000:
-        shown, suffix = absolute / 1_000_000_000, 'B'
-    elif absolute >= 1_000_000:
-        shown, suffix = absolute / 1_000_000, 'M'
-    elif absolute >= 1_000:
-        shown, suffix = absolute / 1_000, 'K'
-    else:
-        shown, suffix = absolute, ''
+    shown, suffix = absolute, ''
+    for threshold, scale_suffix in _COMPACT_SCALES:
+        if absolute >= threshold:
+            shown, suffix = absolute / threshold, scale_suffix
+            break
 
     if suffix:
         compact = f'{shown:.1f}'.rstrip('0').rstrip('.') + suffix
@@ -455,8 +634,9 @@ def format_rounded_percent(value: float) -> str:
 
 
 def compute_cache_networth_label() -> str:
-    accounts_blob = find_blob_by_store_name('accountsStore')
-    history_blob = find_blob_by_store_name('accountsBalancesHistoryStore')
+    blobs = find_blobs_by_store_names(CACHE_STORE_NAMES)
+    accounts_blob = blobs['accountsStore']
+    history_blob = blobs['accountsBalancesHistoryStore']
 
     accounts_payload = decode_payload(accounts_blob)
     history_payload = decode_payload(history_blob)
@@ -467,8 +647,9 @@ def compute_cache_networth_label() -> str:
 
 
 def compute_cache_snapshot() -> Dict[str, Any]:
-    accounts_blob = find_blob_by_store_name('accountsStore')
-    history_blob = find_blob_by_store_name('accountsBalancesHistoryStore')
+    blobs = find_blobs_by_store_names(CACHE_STORE_NAMES)
+    accounts_blob = blobs['accountsStore']
+    history_blob = blobs['accountsBalancesHistoryStore']
     accounts_payload = decode_payload(accounts_blob)
     history_payload = decode_payload(history_blob)
     return {
@@ -480,7 +661,7 @@ def compute_cache_snapshot() -> Dict[str, Any]:
 
 # ----- Live API path -----
 
-def compute_live_networth_label() -> str:
+def _live_totals() -> Tuple[float, float]:
     auth = _load_auth_session()
 
     refresh_token = auth.get('refreshToken')
@@ -508,23 +689,17 @@ def compute_live_networth_label() -> str:
             access_token = sess_access
 
     if access_token is None:
-        token_obj = _refresh_access_token(refresh_token, oauth_cfg)
-        access_token = str(token_obj['accessToken'])
-        _write_token_cache(refresh_token, token_obj)
+        access_token, oauth_cfg = _renew_access_token(refresh_token, oauth_cfg)
 
-    services_url = oauth_cfg['services_url']
+    from urllib.error import HTTPError
 
     try:
-        accounts_obj = _api_get_json(services_url, '/accounts', access_token, str(dataset_id))
-        balances_obj = _api_get_json(services_url, '/accounts/balances', access_token, str(dataset_id))
+        accounts_obj, balances_obj = _fetch_accounts_and_balances(oauth_cfg['services_url'], access_token, str(dataset_id))
     except HTTPError as e:
         if e.code != 401:
             raise
-        token_obj = _refresh_access_token(refresh_token, oauth_cfg)
-        access_token = str(token_obj['accessToken'])
-        _write_token_cache(refresh_token, token_obj)
-        accounts_obj = _api_get_json(services_url, '/accounts', access_token, str(dataset_id))
-        balances_obj = _api_get_json(services_url, '/accounts/balances', access_token, str(dataset_id))
+        access_token, oauth_cfg = _renew_access_token(refresh_token, oauth_cfg)
+        accounts_obj, balances_obj = _fetch_accounts_and_balances(oauth_cfg['services_url'], access_token, str(dataset_id))
 
     accounts = accounts_obj.get('resources')
     balances = balances_obj.get('resources')
@@ -532,7 +707,7 @@ def compute_live_networth_label() -> str:
     if not isinstance(accounts, list) or not isinstance(balances, list):
         raise RuntimeError('Unexpected accounts/balances response shape')
 
-    preferred: Dict[str, str] = {}
+    preferred: Dict[Any, str] = {}
     for acct in accounts:
         if not isinstance(acct, dict):
             continue
@@ -549,179 +724,84 @@ def compute_live_networth_label() -> str:
             or acct.get('isConnected') is True
             or bool(acct.get('institutionLoginId'))
         )
-        preferred[str(account_id)] = 'ONLINE' if is_online else 'CURRENT'
+        kind = 'ONLINE' if is_online else 'CURRENT'
+
+        # Balances are joined on the raw accountId. Register the id's int and str
+        # spellings here, once per account, so mixed JSON types still match
+        # without a str() per balance row.
+        if type(account_id) is int:
+            preferred[account_id] = kind
+            preferred[str(account_id)] = kind
+        elif isinstance(account_id, str):
+            preferred[account_id] = kind
+            try:
+                as_int: Optional[int] = int(account_id)
+            except ValueError:
+                as_int = None
+            if as_int is not None and str(as_int) == account_id:
+                preferred[as_int] = kind
+        else:
+            preferred[str(account_id)] = kind
 
-    totals_by_date: Dict[str, Dict[str, Any]] = {}
+    totals_by_date: Dict[str, float] = defaultdict(float)
+    counts_by_date: Dict[str, int] = defaultdict(int)
     for bal in balances:
-        if not isinstance(bal, dict):
+        try:
+            account_id = bal.get('accountId')
+        except AttributeError:
             continue
 
-        account_id = bal.get('accountId')
-        date = bal.get('balanceOn')
-        btype = bal.get('balanceType')
-        amount = bal.get('balanceAmount')
-
-        if account_id is None or not isinstance(date, str) or not date:
+        if account_id is None:
             continue
-
-        pref = preferred.get(str(account_id))
-        if not pref or btype != pref:
+        if type(account_id) in (int, str):
+            pref = preferred.get(account_id)
+        else:
+            pref = preferred.get(str(account_id))
+        if pref is None or bal.get('balanceType') != pref:
             continue
 
-        if not isinstance(amount, (int, float)):
+        date = bal.get('balanceOn')
+        amount = bal.get('balanceAmount')
+        if not isinstance(date, str) or not date or not isinstance(amount, (int, float)):
             continue
 
-        entry = totals_by_date.setdefault(date, {'total': 0.0, 'count': 0})
-        entry['total'] = float(entry['total']) + float(amount)
-        entry['count'] = int(entry['count']) + 1
+        totals_by_date[date] += amount
+        counts_by_date[date] += 1
 
     if not totals_by_date:
         raise RuntimeError('No balance totals available')
 
-    max_count = max(int(v.get('count', 0)) for v in totals_by_date.values())
-    complete_dates = sorted([d for d, v in totals_by_date.items() if int(v.get('count', 0)) == max_count])
-    all_dates = sorted(totals_by_date.keys())
+    max_count = max(counts_by_date.values())
+    complete_dates = heapq.nlargest(2, (d for d, c in counts_by_date.items() if c == max_count))
 
-    latest_date = complete_dates[-1] if complete_dates else all_dates[-1]
+    latest_date = complete_dates[0]
 
     prev_date: Optional[str] = None
-    if complete_dates and len(complete_dates) >= 2:
-        prev_date = complete_dates[-2]
-    elif len(all_dates) >= 2:
-        prev_date = all_dates[-2]
+    if len(complete_dates) >= 2:
+        prev_date = complete_dates[1]
+    elif len(totals_by_date) >= 2:
+        prev_date = heapq.nlargest(2, totals_by_date)[1]
 
-    latest_total = float(totals_by_date[latest_date]['total'])
+    latest_total = totals_by_date[latest_date]
     percent = 0.0
 
     if prev_date:
-        prev_total = float(totals_by_date[prev_date]['total'])
+        prev_total = totals_by_date[prev_date]
         if abs(prev_total) > 1e-9:
             percent = ((latest_total - prev_total) / abs(prev_total)) * 100.0
 
-    networth_text = format_compact_usd(latest_total)
-    daily_percent_text = format_rounded_percent(percent)
-    return f'{networth_text} {daily_percent_text}'
-
-
-def compute_live_snapshot() -> Dict[str, Any]:
-    auth = _load_auth_session()
-
-    refresh_token = auth.get('refreshToken')
-    dataset_id = auth.get('datasetId')
-    if not isinstance(refresh_token, str) or not refresh_token:
-        raise RuntimeError('Missing refreshToken in authSession (are you logged in?)')
-    if dataset_id is None:
-        raise RuntimeError('Missing datasetId in authSession')
-
-    oauth_cfg = _load_oauth_config()
-    now = _now_utc()
-
-    access_token: Optional[str] = None
-
-    cached = _load_cached_access_token(refresh_token)
-    if cached:
-        cached_access, cached_exp = cached
-        if cached_exp - now > dt.timedelta(minutes=2):
-            access_token = cached_access
-
-    if access_token is None:
-        sess_access = auth.get('accessToken')
-        sess_exp = _parse_iso_datetime(auth.get('accessTokenExpired'))
-        if isinstance(sess_access, str) and sess_access and sess_exp and (sess_exp - now > dt.timedelta(minutes=2)):
-            access_token = sess_access
+    return latest_total, percent
 
-    if access_token is None:
-        token_obj = _refresh_access_token(refresh_token, oauth_cfg)
-        access_token = str(token_obj['accessToken'])
-        _write_token_cache(refresh_token, token_obj)
-
-    services_url = oauth_cfg['services_url']
 
-    try:
-        accounts_obj = _api_get_json(services_url, '/accounts', access_token, str(dataset_id))
-        balances_obj = _api_get_json(services_url, '/accounts/balances', access_token, str(dataset_id))
-    except HTTPError as e:
-        if e.code != 401:
-            raise
-        token_obj = _refresh_access_token(refresh_token, oauth_cfg)
-        access_token = str(token_obj['accessToken'])
-        _write_token_cache(refresh_token, token_obj)
-        accounts_obj = _api_get_json(services_url, '/accounts', access_token, str(dataset_id))
-        balances_obj = _api_get_json(services_url, '/accounts/balances', access_token, str(dataset_id))
-
-    accounts = accounts_obj.get('resources')
-    balances = balances_obj.get('resources')
-
-    if not isinstance(accounts, list) or not isinstance(balances, list):
-        raise RuntimeError('Unexpected accounts/balances response shape')
-
-    preferred: Dict[str, str] = {}
-    for acct in accounts:
-        if not isinstance(acct, dict):
-            continue
-        if acct.get('isDeleted') is True or acct.get('isIgnored') is True or acct.get('isClosed') is True:
-            continue
-
-        account_id = acct.get('id')
-        if account_id is None:
-            continue
-
-        is_online = (
-            isinstance(acct.get('onlineBalance'), (int, float))
-            or acct.get('isConnected') is True
-            or bool(acct.get('institutionLoginId'))
-        )
-        preferred[str(account_id)] = 'ONLINE' if is_online else 'CURRENT'
-
-    totals_by_date: Dict[str, Dict[str, Any]] = {}
-    for bal in balances:
-        if not isinstance(bal, dict):
-            continue
-
-        account_id = bal.get('accountId')
-        date = bal.get('balanceOn')
-        btype = bal.get('balanceType')
-        amount = bal.get('balanceAmount')
-
-        if account_id is None or not isinstance(date, str) or not date:
-            continue
-
-        pref = preferred.get(str(account_id))
-        if not pref or btype != pref:
-            continue
-
-        if not isinstance(amount, (int, float)):
-            continue
-
-        entry = totals_by_date.setdefault(date, {'total': 0.0, 'count': 0})
-        entry['total'] = float(entry['total']) + float(amount)
-        entry['count'] = int(entry['count']) + 1
-
-    if not totals_by_date:
-        raise RuntimeError('No balance totals available')
-
-    max_count = max(int(v.get('count', 0)) for v in totals_by_date.values())
-    complete_dates = sorted([d for d, v in totals_by_date.items() if int(v.get('count', 0)) == max_count])
-    all_dates = sorted(totals_by_date.keys())
-
-    latest_date = complete_dates[-1] if complete_dates else all_dates[-1]
-
-    prev_date: Optional[str] = None
-    if complete_dates and len(complete_dates) >= 2:
-        prev_date = complete_dates[-2]
-    elif len(all_dates) >= 2:
-        prev_date = all_dates[-2]
-
-    latest_total = float(totals_by_date[latest_date]['total'])
-    percent = 0.0
+def compute_live_networth_label() -> str:
+    total, percent = _live_totals()
+    return f'{format_compact_usd(total)} {format_rounded_percent(percent)}'
 
-    if prev_date:
-        prev_total = float(totals_by_date[prev_date]['total'])
-        if abs(prev_total) > 1e-9:
-            percent = ((latest_total - prev_total) / abs(prev_total)) * 100.0
 
+def compute_live_snapshot() -> Dict[str, Any]:
+    total, percent = _live_totals()
     return {
-        'total': latest_total,
+        'total': total,
         'daily_percent': percent,
         'source': 'live',
     }
@@ -765,6 +845,7 @@ def diagnostics_payload() -> Dict[str, Any]:
         'state_file_exists': STATE_FILE.exists(),
         'token_cache_exists': TOKEN_CACHE_FILE.exists(),
         'oauth_config_exists': OAUTH_CONFIG_FILE.exists(),
+        'auth_session_cache_exists': AUTH_SESSION_CACHE_FILE.exists(),
     }
     try:
         snap = fetch_snapshot()
@@ -786,12 +867,12 @@ def diagnostics_payload() -> Dict[str, Any]:
 
 
 def main() -> int:
-    parser = argparse.ArgumentParser(add_help=False)
-    parser.add_argument('--json', action='store_true')
-    parser.add_argument('--diagnostics', action='store_true')
-    args, _ = parser.parse_known_args()
+    # Two boolean flags; unknown arguments are ignored as before.
+    argv = sys.argv[1:]
+    want_json = '--json' in argv
+    want_diagnostics = '--diagnostics' in argv
 
-    if args.diagnostics:
+    if want_diagnostics:
         print(json.dumps(diagnostics_payload(), indent=2, sort_keys=True))
         return 0
 
@@ -799,7 +880,7 @@ def main() -> int:
         snapshot = fetch_snapshot()
         label = compact_label(snapshot)
 
-        if args.json:
+        if want_json:
             print(json.dumps({
                 'ok': True,
                 'source': snapshot['source'],
@@ -819,7 +900,7 @@ def main() -> int:
         if ':' in msg:
             code, text = msg.split(':', 1)
 
-        if args.json:
+        if want_json:
             print(json.dumps({
                 'ok': False,
                 'error_code': code,